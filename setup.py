@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+"""
+Builds the optional compiled IK kernels into src/:
+
+    python3 setup.py build_ext --inplace
+"""
+
+import numpy as np
+from setuptools import setup, Extension
+from Cython.Build import cythonize
+
+setup(
+    name="antropomorphic_project_kernels",
+    package_dir={"": "src"},
+    ext_modules=cythonize(
+        [Extension("_ik_fk", ["src/_ik_fk.pyx"], include_dirs=[np.get_include()])]
+    ),
+)
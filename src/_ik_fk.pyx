@@ -0,0 +1,94 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+"""
+Compiled IK kernels for the 3-DOF arm.
+Build with `python3 setup.py build_ext --inplace` from the package root.
+Without it, ik_antropomorphic_arm falls back to its numba kernel.
+"""
+
+import numpy as np
+from libc.math cimport sqrt, acos, atan2, cos, sin, fabs, M_PI, NAN
+
+# Joint limits (radians), same as ik_antropomorphic_arm
+cdef double T2_MIN = -M_PI/4
+cdef double T2_MAX = 3*M_PI/4
+cdef double T3_MIN = -3*M_PI/4
+cdef double T3_MAX = 3*M_PI/4
+
+# Candidate lanes: (A+, theta3+), (A+, theta3-), (A-, theta3+), (A-, theta3-)
+cdef double[4] A_SIGNS = [1.0, 1.0, -1.0, -1.0]
+cdef double[4] THETA3_SIGNS = [1.0, -1.0, 1.0, -1.0]
+
+
+cdef void ik(double px, double py, double pz, double* out) noexcept nogil:
+    """
+    Fills the 5x4 row-major `out` with the same structure-of-arrays layout as
+    ik_antropomorphic_arm._ik_fill: theta1, theta2, theta3, config code, flag.
+    """
+    cdef double B = pz
+    cdef double r2 = px*px + py*py
+    cdef double cos_theta3 = (r2 + B*B - 2)*0.5
+    cdef double r, acos_theta3, theta1, theta1_flipped, A, theta3, C, D, theta2
+    cdef int lane
+
+    # Workspace check, identical for A+ and A-
+    if fabs(cos_theta3) > 1:
+        for lane in range(4):
+            out[lane] = NAN
+            out[4 + lane] = NAN
+            out[8 + lane] = NAN
+            out[12 + lane] = -1.0
+            out[16 + lane] = -1.0
+        return
+
+    r = sqrt(r2)
+    acos_theta3 = acos(cos_theta3)
+
+    # theta1 calculation (adjust for A- case)
+    theta1 = atan2(py, px)
+    theta1_flipped = theta1 + M_PI if theta1 < 0 else theta1 - M_PI
+
+    for lane in range(4):
+        A = A_SIGNS[lane] * r
+        theta3 = THETA3_SIGNS[lane] * acos_theta3
+
+        # Shoulder angle calculation
+        C = 2 * cos(theta3/2) * cos(theta3/2)
+        D = sin(theta3)
+        theta2 = atan2(B*C - A*D, A*C + B*D)
+
+        out[lane] = theta1_flipped if A_SIGNS[lane] < 0 else theta1
+        out[4 + lane] = theta2
+        out[8 + lane] = theta3
+        out[12 + lane] = (2.0 if theta2 >= 0 else 0.0) + (1.0 if theta3 >= 0 else 0.0)
+        out[16 + lane] = 1.0 if (T2_MIN <= theta2 <= T2_MAX and T3_MIN <= theta3 <= T3_MAX) else 0.0
+
+
+def ik_candidates(double px, double py, double pz):
+    """IK candidates for a single target as a (5, 4) array, see ik()"""
+    result = np.empty((5, 4))
+    cdef double[:, ::1] view = result
+    with nogil:
+        ik(px, py, pz, &view[0, 0])
+    return result
+
+
+def ik_select(double px, double py, double pz, int elbow_code, double prefer_A_sign):
+    """Single IK solution, same contract as ik_antropomorphic_arm._ik_select"""
+    cdef double[20] out
+    cdef int lane, best = -1
+    with nogil:
+        ik(px, py, pz, out)
+        if out[16] >= 0:
+            for lane in range(4):
+                if out[16 + lane] > 0 and out[12 + lane] == elbow_code:
+                    if A_SIGNS[lane] == prefer_A_sign:
+                        best = lane
+                        break
+                    if best < 0:
+                        best = lane
+    if out[16] < 0:
+        return -1, NAN, NAN, NAN, 0.0
+    if best < 0:
+        return 0, NAN, NAN, NAN, 0.0
+    return 1, out[best], out[4 + best], out[8 + best], A_SIGNS[best]
+
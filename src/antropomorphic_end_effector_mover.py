@@ -2,11 +2,14 @@
 
 import rospy
 import numpy as np
+import threading
+from math import sqrt
+from concurrent.futures import ThreadPoolExecutor
 from planar_3dof_control.msg import EndEffector
-from geometry_msgs.msg import Vector3
+from geometry_msgs.msg import Vector3, PoseArray
 from move_joints import JointMover
 from rviz_marker import MarkerBasics
-from ik_antropomorphic_arm import inverse_kinematics
+from ik_antropomorphic_arm import solve_ik, inverse_kinematics_batch, _CFG_CODES, _A_SIGNS
 
 class AntropomorphicEndEffectorMover:
     def __init__(self):
@@ -16,27 +19,56 @@ class AntropomorphicEndEffectorMover:
         self.marker_basics = MarkerBasics()
         self.goal_marker_index = 0
         self.actual_marker_index = 0  # Separate range for actual positions
-        
+        # Publish an actual position marker every Nth pose message only
+        self._pub_every = max(1, rospy.get_param('~marker_decimation', 10))
+        self._pub_counter = 0
+
+        # A branch of the last IK solution, used to warm start the next one
+        self._last_A_sign = 0.0
+
+        # Goals are solved off the subscriber thread, only the newest solved goal is commanded
+        self._ik_pool = ThreadPoolExecutor(max_workers=rospy.get_param('~ik_workers', 2))
+        rospy.on_shutdown(lambda: self._ik_pool.shutdown(wait=False))
+        self._goal_lock = threading.Lock()
+        self._goal_seq = 0
+        self._commanded_seq = 0
+
+        # Current state, goal kept as plain floats for the per-message error calculation.
+        # Set before subscribing, callbacks can fire while setup_subscribers() waits
+        self.goal_x = self.goal_y = self.goal_z = None
+        self.current_position = None
+        self.elbow_config = "plus"  # Default elbow configuration
+
         # Joint controller
         self.joint_mover = JointMover()
         
         # Initialize subscribers
         self.setup_subscribers()
-                
-        # Current state
-        self.current_goal = None
-        self.current_position = None
-        self.elbow_config = "plus"  # Default elbow configuration
         
         rospy.loginfo("3DOF Arm Controller Ready")
 
+    @property
+    def elbow_config(self):
+        return self._elbow_config
+
+    @elbow_config.setter
+    def elbow_config(self, value):
+        """Store the elbow policy and its integer code used to match IK solutions"""
+        self._elbow_config = value
+        self._elbow_code = _CFG_CODES.get(value, -1)
+
     def setup_subscribers(self):
         """Initialize ROS subscribers with proper waiting"""
         # Goal position subscriber
-        rospy.Subscriber("/ee_pose_commands", EndEffector, self.goal_callback)
+        rospy.Subscriber("/ee_pose_commands", EndEffector, self.goal_callback,
+                         queue_size=1, tcp_nodelay=True)
         
         # Actual position subscriber
-        rospy.Subscriber("/end_effector_real_pose", Vector3, self.position_callback)
+        rospy.Subscriber("/end_effector_real_pose", Vector3, self.position_callback,
+                         queue_size=1, tcp_nodelay=True)
+
+        # Trajectory subscriber, waypoints are solved in one batch
+        rospy.Subscriber("/ee_pose_trajectory", PoseArray, self.trajectory_callback)
         
         # Wait for initial messages
         rospy.loginfo("Waiting for initial messages...")
@@ -45,68 +77,128 @@ class AntropomorphicEndEffectorMover:
         rospy.loginfo("Initialization complete")
 
     def goal_callback(self, msg):
-        """Process new end effector goal position"""
-        self.current_goal = (msg.ee_xy_theta.x, msg.ee_xy_theta.y, msg.ee_xy_theta.z)
+        """Queue a new end effector goal position for the IK workers"""
         self.elbow_config = msg.elbow_policy.data
+        with self._goal_lock:
+            self._goal_seq += 1
+            seq = self._goal_seq
+        future = self._ik_pool.submit(self.solve_goal, seq, msg.ee_xy_theta.x, msg.ee_xy_theta.y,
+                                      msg.ee_xy_theta.z, self.elbow_config, self._elbow_code)
+        future.add_done_callback(self._log_solve_error)
+
+    def _log_solve_error(self, future):
+        """Report exceptions raised on an IK worker, the executor would otherwise drop them"""
+        if not future.cancelled() and future.exception() is not None:
+            rospy.logerr(f"Failed to solve goal: {future.exception()!r}")
+
+    def solve_goal(self, seq, gx, gy, gz, elbow_config, elbow_code):
+        """Solve IK for a goal on a worker thread and move to it"""
+        # Calculate inverse kinematics for our elbow configuration, staying on the last branch if possible
+        status, theta1, theta2, theta3, A_sign = solve_ik(gx, gy, gz, elbow_code, self._last_A_sign)
         
-        # Calculate inverse kinematics
-        ik_results = inverse_kinematics(
-            px=self.current_goal[0],
-            py=self.current_goal[1],
-            pz=self.current_goal[2],
-            joint_limits=True
-        )
-        
-        if ik_results['unreachable']:
-            rospy.logwarn(f"Target unreachable: {self.current_goal}")
+        if status < 0:
+            rospy.logwarn(f"Target unreachable: {(gx, gy, gz)}")
             return
-            
-        # Find solution matching our elbow configuration
-        valid_solution = None
-        for solution in ik_results['valid']:
-            theta1, theta2, theta3, config = solution
-            if config == self.elbow_config:
-                valid_solution = (theta1, theta2, theta3)
-                break
-        
-        if valid_solution:
+        if status == 0:
+            rospy.logwarn(f"No valid solution for {elbow_config} config at {(gx, gy, gz)}")
+            return
+
+        with self._goal_lock:
+            # A newer goal was already commanded by another worker
+            if seq < self._commanded_seq:
+                return
+            self._commanded_seq = seq
+            self.goal_x, self.goal_y, self.goal_z = gx, gy, gz
+            self._last_A_sign = A_sign
+
             # Move joints to solution
-            self.joint_mover.move_all_joints(*valid_solution)
+            self.joint_mover.move_all_joints(theta1, theta2, theta3)
             
             # Visualize goal (green sphere)
             self.marker_basics.publish_point(
-                x=self.current_goal[0],
-                y=self.current_goal[1],
-                z=self.current_goal[2],
+                x=gx,
+                y=gy,
+                z=gz,
                 index=self.goal_marker_index
             )
             self.goal_marker_index = (self.goal_marker_index + 1) 
-        else:
-            rospy.logwarn(f"No valid solution for {self.elbow_config} config at {self.current_goal}")
+
+    def trajectory_callback(self, msg):
+        """
+        Solve IK for all waypoints at once, then command them sequentially.
+        The trajectory takes a goal sequence number like a single goal and is
+        abandoned as soon as a newer goal or trajectory arrives.
+        """
+        waypoints = np.array([(pose.position.x, pose.position.y, pose.position.z) for pose in msg.poses])
+        if len(waypoints) == 0:
+            return
+        with self._goal_lock:
+            self._goal_seq += 1
+            seq = self._goal_seq
+            A_sign = self._last_A_sign
+        elbow_config, elbow_code = self.elbow_config, self._elbow_code
+
+        candidates = inverse_kinematics_batch(waypoints)
+        # Candidates within joint limits matching our elbow configuration
+        matches = (candidates[:, 4, :] > 0) & (candidates[:, 3, :] == elbow_code)
+
+        rate = rospy.Rate(rospy.get_param('~trajectory_rate', 10.0))
+        # Plain floats for commanding and logging
+        for i, (x, y, z) in enumerate(waypoints.tolist()):
+            if rospy.is_shutdown():
+                break
+            if candidates[i, 4, 0] < 0:
+                rospy.logwarn(f"Target unreachable: {(x, y, z)}")
+                continue
+            if not matches[i].any():
+                rospy.logwarn(f"No valid solution for {elbow_config} config at {(x, y, z)}")
+                continue
+
+            # Stay on the branch of the previous solution if possible, as solve_ik does
+            preferred = matches[i] & (_A_SIGNS == A_sign)
+            lane = preferred.argmax() if preferred.any() else matches[i].argmax()
+            theta1, theta2, theta3 = candidates[i, :3, lane].tolist()
+            A_sign = float(_A_SIGNS[lane])
+            with self._goal_lock:
+                if self._goal_seq != seq:
+                    rospy.logwarn("Trajectory interrupted by a newer goal")
+                    return
+                self._commanded_seq = seq
+                self._last_A_sign = A_sign
+                self.goal_x, self.goal_y, self.goal_z = x, y, z
+                self.joint_mover.move_all_joints(theta1, theta2, theta3)
+
+                # Visualize goal (green sphere)
+                self.marker_basics.publish_point(x=x, y=y, z=z, index=self.goal_marker_index)
+                self.goal_marker_index = (self.goal_marker_index + 1)
+            rate.sleep()
 
     def position_callback(self, msg):
         """Update and visualize actual end effector position"""
         self.current_position = (msg.x, msg.y, msg.z)
         
         # Visualize actual position (red sphere)
-        self.marker_basics.publish_point(
-            x=msg.x,
-            y=msg.y,
-            z=msg.z,
-            index=self.actual_marker_index
-        )
-        self.actual_marker_index = (self.actual_marker_index + 1) 
+        self._pub_counter += 1
+        if self._pub_counter % self._pub_every == 0:
+            self.marker_basics.publish_point(
+                x=msg.x,
+                y=msg.y,
+                z=msg.z,
+                index=self.actual_marker_index
+            )
+            self.actual_marker_index = (self.actual_marker_index + 1) 
         
         # Log position error if we have a current goal
-        if self.current_goal:
-            error = np.linalg.norm(np.array(self.current_position) - np.array(self.current_goal))
+        if self.goal_x is not None:
+            dx = msg.x - self.goal_x
+            dy = msg.y - self.goal_y
+            dz = msg.z - self.goal_z
+            error = sqrt(dx*dx + dy*dy + dz*dz)
             rospy.logdebug(f"Position error: {error:.4f} m")
 
     def run(self):
-        """Main control loop"""
-        rate = rospy.Rate(10)  # 10Hz update rate
-        while not rospy.is_shutdown():
-            rate.sleep()
+        """Main control loop, all work happens in the subscriber callbacks"""
+        rospy.spin()
 
 if __name__ == '__main__':
     try:
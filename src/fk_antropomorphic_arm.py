@@ -1,42 +1,58 @@
 #!/usr/bin/env python3
-from generate_matrices import DHMatrixGenerator
-from sympy import pi  
+import sys
+from generate_matrices import DHMatrixGenerator, pi
+from sympy import Matrix
 
 if __name__ == "__main__":
-    # Ask theta from user
-    theta1 = float(input("Enter the value for theta_1: "))
-    theta2 = float(input("Enter the value for theta_2: "))
-    theta3 = float(input("Enter the value for theta_3: "))
-
     # From checkpoint
     chain_length = 3
     matrices_to_simplify = ["A01", "A12", "A23", "A03"]
-    save_simplified_matrices = ["A03"]
     
-    # Use LaTeX-compatible symbols
+    # Use LaTeX-compatible symbols, thetas stay symbolic and are evaluated numerically below
     substitutions = {
-        "A01": {'alpha': pi/2, 'r': 0.0, 'd': 0.0, 'theta': theta1},
-        "A12": {'alpha':0.0, 'r': 1.0, 'd': 0.0, 'theta': theta2},
-        "A23": {'alpha':0.0, 'r': 1.0, 'd': 0.0, 'theta': theta3}
+        "A01": {'alpha': pi/2, 'r': 0.0, 'd': 0.0},
+        "A12": {'alpha':0.0, 'r': 1.0, 'd': 0.0},
+        "A23": {'alpha':0.0, 'r': 1.0, 'd': 0.0}
     }
     
-    # Initialize and process
-    dh = DHMatrixGenerator()
+    # Rendering the evaluated matrix to PNG is slow, only done with --preview
+    enable_preview = "--preview" in sys.argv
+
+    # Initialize and process once, then compile A03 into a numeric function
+    dh = DHMatrixGenerator(enable_preview=enable_preview)
     matrix_names = dh.generate_chain(chain_length)
     dh.create_matrices(matrix_names)
     dh.apply_substitutions(substitutions)
     dh.build_compound_matrices(chain_length)
     dh.simplify_matrices(matrices_to_simplify)
-    dh.save_matrices(save_simplified_matrices, simplified=True, postfix="_simplify_evaluated")
+    dh.lambdify_matrix(["A03"])
 
-    # Extract position (last column, first 3 rows)
-    tf_matrix = dh.get_matrix("A03", simplified=True)
-    position = tf_matrix[:3, 3]
-    orientation = tf_matrix[:3, :3]
-    print("Position Matrix: ")
-    print(position)
-    
-    print("\nOrientation Matrix: ")
-    print(orientation)
+    render = None  # Last preview of the evaluated matrix, all queries write the same file
+    while True:
+        # Ask theta from user
+        try:
+            theta1 = float(input("Enter the value for theta_1: "))
+            theta2 = float(input("Enter the value for theta_2: "))
+            theta3 = float(input("Enter the value for theta_3: "))
+        except (EOFError, KeyboardInterrupt):
+            break
+
+        tf_matrix = dh.eval_matrix("A03", theta_1=theta1, theta_2=theta2, theta_3=theta3)
+        if enable_preview:
+            # Renders can finish out of order, let the previous one land before overwriting it
+            if render is not None:
+                render.result()
+            render = dh.preview_matrix(Matrix(tf_matrix), "A03_simplify_evaluated.png")
+
+        # Extract position (last column, first 3 rows)
+        position = tf_matrix[:3, 3]
+        orientation = tf_matrix[:3, :3]
+        print("Position Matrix: ")
+        print(position)
+        
+        print("\nOrientation Matrix: ")
+        print(orientation)
+
+    dh.flush()
 
     # END OF PROGRAM
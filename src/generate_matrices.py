@@ -1,34 +1,65 @@
 #!/usr/bin/env python3
 
-from sympy import Matrix, cos, sin, Symbol, simplify, trigsimp, pi, symbols
+import numpy as np
+from sympy import trigsimp, lambdify, count_ops, factor_terms, Float, Integer
+from sympy.simplify.fu import TR10i
+try:
+    # symengine's C++ core is much faster for matrix construction, substitution and multiplication
+    import symengine as _sym
+except ImportError:
+    import sympy as _sym
 from sympy.interactive import printing
 from typing import List, Dict, Optional, Union
-from functools import reduce
+from concurrent.futures import ProcessPoolExecutor
+
+Matrix, cos, sin, Symbol, pi = _sym.Matrix, _sym.cos, _sym.sin, _sym.Symbol, _sym.pi
+
+
+def _to_sympy(expr):
+    """Convert a backend expression to sympy, used where only sympy is available"""
+    return expr._sympy_() if hasattr(expr, "_sympy_") else expr
+
+
+def _fast_trigsimp(matrix):
+    """Targeted trig rewrite for DH chains, falling back to trigsimp if it doesn't shrink the matrix"""
+    matrix = _to_sympy(matrix)
+    # Substituted lengths like r = 1.0 leave 1.0 next to 1 coefficients, which TR10i won't pair up
+    normalized = matrix.xreplace({f: Integer(int(f)) for f in matrix.atoms(Float) if float(f).is_integer()})
+    # DH products only need sum-of-products -> compound angle, e.g. cos(a)cos(b) - sin(a)sin(b) -> cos(a + b)
+    rewritten = normalized.applyfunc(lambda expr: factor_terms(TR10i(expr)))
+    if count_ops(rewritten) < count_ops(matrix):
+        return rewritten
+    return trigsimp(matrix)
+
 
 class DHMatrixGenerator:
-    def __init__(self):
-        """Initialize the DH matrix generator"""
+    def __init__(self, enable_preview: bool = False):
+        """Initialize the DH matrix generator, LaTeX/PNG output only if enable_preview"""
         printing.init_printing(use_latex=True)
         self.generic_matrix = None
         self.matrices = {}  # Stores all created matrices
         self.simplified_matrices = {}  # Stores simplified versions
+        self._numeric = {}  # Stores compiled numeric functions
+        self.enable_preview = enable_preview
+        self._pool = None  # Background renderer, created on first preview
+        self._pending = []
         self._create_generic_matrix()
 
     def _create_generic_matrix(self):
-        """Create and simplify the generic DH matrix"""
+        """Create the generic DH matrix (already canonical, so it is not simplified)"""
         theta_i = Symbol("theta_i")
         alpha_i = Symbol("alpha_i")
         r_i = Symbol("r_i")
         d_i = Symbol("d_i")
         
-        self.generic_matrix = simplify(Matrix([
+        self.generic_matrix = Matrix([
             [cos(theta_i), -sin(theta_i)*cos(alpha_i), 
              sin(theta_i)*sin(alpha_i), r_i*cos(theta_i)],
             [sin(theta_i), cos(theta_i)*cos(alpha_i), 
              -cos(theta_i)*sin(alpha_i), r_i*sin(theta_i)],
             [0, sin(alpha_i), cos(alpha_i), d_i],
             [0, 0, 0, 1]
-        ]))
+        ])
 
     def generate_chain(self, chain_length: int):
         """Generate standard matrix names for a kinematic chain"""
@@ -80,27 +111,50 @@ class DHMatrixGenerator:
                         matrices_to_multiply.append(self.matrices[individual_name])
                 
                 if matrices_to_multiply:
-                    self.matrices[matrix_name] = reduce(lambda a, b: a * b, matrices_to_multiply)
+                    # Multiply right to left, keeping the rightmost products small
+                    compound = matrices_to_multiply[-1]
+                    for matrix in reversed(matrices_to_multiply[:-1]):
+                        compound = matrix * compound
+                    self.matrices[matrix_name] = compound
 
     def simplify_matrices(self, matrix_names: List[str]):
         """Simplify specified matrices"""
         for name in matrix_names:
             if name in self.matrices and self.matrices[name] is not None:
-                self.simplified_matrices[name] = trigsimp(self.matrices[name])
+                self.simplified_matrices[name] = _fast_trigsimp(self.matrices[name])
 
     def save_matrices(self, matrix_names: List[str], simplified: bool = False, prefix: str = "", postfix: str = ""):
         """Save specified matrices to files with proper LaTeX escaping"""
-        from sympy import preview
-        
         for name in matrix_names:        
             if simplified:
                 if name in self.simplified_matrices and self.simplified_matrices[name] is not None:
-                    matrix = self.simplified_matrices.get(name)
-                    preview(matrix, viewer='file', filename=f"{prefix}{name}{postfix}.png", dvioptions=['-D','300'])
+                    self.preview_matrix(self.simplified_matrices.get(name), f"{prefix}{name}{postfix}.png")
             else:
                 if name in self.matrices and self.matrices[name] is not None:
-                    matrix = self.matrices.get(name)                
-                    preview(matrix, viewer='file', filename=f"{prefix}{name}{postfix}.png", dvioptions=['-D','300'])
+                    self.preview_matrix(self.matrices.get(name), f"{prefix}{name}{postfix}.png")
+
+    def preview_matrix(self, matrix, filename: str):
+        """Render a matrix to a PNG in a background process, no-op unless enable_preview. Returns the future"""
+        if not self.enable_preview:
+            return None
+        from sympy import preview  # Only needed when rendering
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=2)
+        future = self._pool.submit(
+            preview, _to_sympy(matrix), viewer='file', filename=filename, dvioptions=['-D','300'])
+        self._pending.append(future)
+        return future
+
+    def flush(self):
+        """Wait for all pending previews to be written"""
+        pending, self._pending = self._pending, []
+        try:
+            for future in pending:
+                future.result()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
 
     def get_matrix(self, matrix_name: str, simplified: bool =False):
         if simplified:
@@ -110,6 +164,55 @@ class DHMatrixGenerator:
             if matrix_name in self.matrices and self.matrices[matrix_name] is not None:
                 return self.matrices.get(matrix_name)
 
+    def lambdify_position(self, names=("A03",), modules="numpy"):
+        """Compile the position column of specified matrices into numeric functions"""
+        for name in names:
+            self._compile(name, "position", modules)
+
+    def lambdify_matrix(self, names=("A03",), modules="numpy"):
+        """Compile specified matrices into numeric functions"""
+        for name in names:
+            self._compile(name, "matrix", modules)
+
+    def eval_position(self, name: str, **subs) -> np.ndarray:
+        """Evaluate the position column of a matrix for the given symbol values"""
+        return self._evaluate(name, "position", subs)
+
+    def eval_matrix(self, name: str, **subs) -> np.ndarray:
+        """Evaluate a matrix for the given symbol values"""
+        return self._evaluate(name, "matrix", subs)
+
+    def _compile(self, name: str, part: str, modules="numpy"):
+        """Lambdify a matrix (or its position column) with CSE once and cache the callable"""
+        matrix = self.get_matrix(name, simplified=True)
+        if matrix is None:
+            matrix = self.get_matrix(name)
+        if matrix is None:
+            raise ValueError(f"Matrix {name} not initialized")
+
+        matrix = _to_sympy(matrix)
+        expr = matrix[:3, 3] if part == "position" else matrix
+        free_symbols = sorted(expr.free_symbols, key=lambda s: s.name)
+        try:
+            # Common subexpressions (cos(theta_2 + theta_3), ...) are computed once per call
+            func = lambdify(free_symbols, expr, modules=modules, cse=True)
+        except TypeError:
+            # sympy < 1.9 has no cse support in lambdify
+            func = lambdify(free_symbols, expr, modules=modules)
+        self._numeric[(name, part)] = ([s.name for s in free_symbols], func)
+
+    def _evaluate(self, name: str, part: str, subs: Dict[str, float]) -> np.ndarray:
+        if (name, part) not in self._numeric:
+            self._compile(name, part)
+        symbol_names, func = self._numeric[(name, part)]
+
+        missing = [n for n in symbol_names if n not in subs]
+        if missing:
+            raise ValueError(f"Missing values for {missing} in {name}")
+
+        result = np.asarray(func(*(subs[n] for n in symbol_names)), dtype=float)
+        return result.ravel() if part == "position" else result
+
 def main():
     # From checkpoint
     chain_length = 3
@@ -125,7 +228,7 @@ def main():
     }
     
     # Initialize and process
-    dh = DHMatrixGenerator()
+    dh = DHMatrixGenerator(enable_preview=True)
     matrix_names = dh.generate_chain(chain_length)
     dh.create_matrices(matrix_names)
     dh.apply_substitutions(substitutions)
@@ -133,6 +236,7 @@ def main():
     dh.simplify_matrices(matrices_to_simplify)
     dh.save_matrices(save_matrices)
     dh.save_matrices(save_simplified_matrices, simplified=True, postfix="_simplify")
+    dh.flush()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,6 +1,119 @@
 #!/usr/bin/env python3
 
+import math
 import numpy as np
+from numba import njit, prange
+
+# Elbow configurations encoded as 2 bits: (theta2 >= 0) << 1 | (theta3 >= 0)
+_CFG_CODES = {"plus-plus": 3, "plus-minus": 2, "minus-plus": 1, "minus-minus": 0}
+_CFG_NAMES = ("minus-minus", "minus-plus", "plus-minus", "plus-plus")
+
+# Joint limits (radians)
+_T2_MIN, _T2_MAX = -math.pi/4, 3*math.pi/4
+_T3_MIN, _T3_MAX = -3*math.pi/4, 3*math.pi/4
+
+# Candidate lanes: (A+, theta3+), (A+, theta3-), (A-, theta3+), (A-, theta3-)
+_A_SIGNS = np.array([1.0, 1.0, -1.0, -1.0])
+_THETA3_SIGNS = np.array([1.0, -1.0, 1.0, -1.0])
+
+
+@njit(nogil=True, cache=True, fastmath=True)
+def _ik_fill(px, py, pz, out):
+    """
+    Closed-form IK candidates for the 3-DOF arm, compiled with numba.
+    All four candidates are evaluated at once as length-4 lanes.
+
+    Fills the (5, 4) array `out` field by field (structure of arrays), one
+    lane per candidate ordered as _A_SIGNS/_THETA3_SIGNS. Fields are theta1,
+    theta2, theta3, the elbow config code (see _CFG_CODES, -1 if unreachable)
+    and a flag: 1.0 within joint limits, 0.0 violating them, -1.0 unreachable.
+    """
+    B = pz
+
+    # Workspace check, identical for A+ and A- since it only depends on A**2
+    r2 = px*px + py*py
+    cos_theta3 = (r2 + B*B - 2)*0.5
+    if abs(cos_theta3) > 1:
+        out[:3, :] = np.nan
+        out[3:, :] = -1.0
+        return
+
+    A = _A_SIGNS * math.sqrt(r2)
+    theta3 = _THETA3_SIGNS * math.acos(cos_theta3)
+
+    # Shoulder angle calculation
+    C = 2 * (np.cos(theta3/2)**2)
+    D = np.sin(theta3)
+    theta2 = np.arctan2(B*C - A*D, A*C + B*D)
+
+    # theta1 calculation (adjust for A- case)
+    theta1 = math.atan2(py, px)
+    theta1_flipped = theta1 + math.pi if theta1 < 0 else theta1 - math.pi
+
+    out[0, :] = np.where(_A_SIGNS < 0, theta1_flipped, theta1)
+    out[1, :] = theta2
+    out[2, :] = theta3
+    out[3, :] = (theta2 >= 0)*2 + (theta3 >= 0)
+    out[4, :] = ((theta2 >= _T2_MIN) & (theta2 <= _T2_MAX)
+                 & (theta3 >= _T3_MIN) & (theta3 <= _T3_MAX))
+
+
+@njit(nogil=True, cache=True, fastmath=True)
+def _ik_kernel(px, py, pz):
+    """IK candidates for a single target as a (5, 4) array, see _ik_fill"""
+    out = np.empty((5, 4))
+    _ik_fill(px, py, pz, out)
+    return out
+
+
+@njit(nogil=True, cache=True, fastmath=True)
+def _ik_select(px, py, pz, elbow_code, prefer_A_sign):
+    """
+    Single IK solution within joint limits with the requested elbow config code.
+    Among matching candidates the one on the prefer_A_sign branch wins, which
+    keeps consecutive goals on the same branch (0.0 for no preference).
+
+    Returns:
+        (status, theta1, theta2, theta3, A_sign) with status 1 if a solution was
+        found, 0 if none matches and -1 if the target is unreachable
+    """
+    out = np.empty((5, 4))
+    _ik_fill(px, py, pz, out)
+    if out[4, 0] < 0:
+        return -1, np.nan, np.nan, np.nan, 0.0
+
+    best = -1
+    for lane in range(4):
+        if out[4, lane] > 0 and out[3, lane] == elbow_code:
+            if _A_SIGNS[lane] == prefer_A_sign:
+                best = lane
+                break
+            if best < 0:
+                best = lane
+    if best < 0:
+        return 0, np.nan, np.nan, np.nan, 0.0
+    return 1, out[0, best], out[1, best], out[2, best], _A_SIGNS[best]
+
+
+@njit(parallel=True, nogil=True, cache=True, fastmath=True)
+def _ik_batch(P, out):
+    """IK candidates for each row of the (N, 3) targets P into the (N, 5, 4) out"""
+    for i in prange(P.shape[0]):
+        _ik_fill(P[i, 0], P[i, 1], P[i, 2], out[i])
+
+
+# Compile (or load from cache) at import so the first ROS callback doesn't pay the JIT cost
+_ik_kernel(1.0, 0.0, 1.0)
+_ik_select(1.0, 0.0, 1.0, 3, 0.0)
+_ik_batch(np.array([[1.0, 0.0, 1.0]]), np.empty((1, 5, 4)))
+
+try:
+    # Compiled C kernel (see setup.py), the numba kernel is kept for systems without a C toolchain
+    from _ik_fk import ik_candidates as _ik_candidates, ik_select as _ik_select_compiled
+except ImportError:
+    _ik_candidates = _ik_kernel
+    _ik_select_compiled = _ik_select
+
 
 def inverse_kinematics(px, py, pz, joint_limits=True):
     """
@@ -13,60 +126,63 @@ def inverse_kinematics(px, py, pz, joint_limits=True):
         
     Returns:
         {
-            'valid': List of valid (theta1, theta2, theta3) solutions,
-            'invalid': List of solutions violating joint limits,
+            'theta1', 'theta2', 'theta3': (4,) arrays of candidate joint angles,
+            'cfg': (4,) int8 array of elbow config codes (see _CFG_CODES),
+            'A_sign': (4,) array of the A branch of each candidate,
+            'valid_mask': (4,) bool array, True for candidates within joint limits,
             'unreachable': Bool if target is outside workspace
         }
     """
-    # Joint limits (radians)
-    theta2_min, theta2_max = -np.pi/4, 3*np.pi/4
-    theta3_min, theta3_max = -3*np.pi/4, 3*np.pi/4
+    candidates = _ik_candidates(float(px), float(py), float(pz))
+    unreachable = bool(candidates[4, 0] < 0)
 
-    results = {'valid': [], 'invalid': [], 'unreachable': False}
+    if joint_limits or unreachable:
+        valid_mask = candidates[4] > 0
+    else:
+        valid_mask = np.ones(4, dtype=bool)
 
-    # Consider both A+ and A- cases
-    for A_sign in [1, -1]:
-        A = A_sign * np.sqrt(px**2 + py**2)
-        B = pz
-        
-        # Workspace check: enforce joint limits
-        cos_theta3 = (A**2 + B**2 - 2)/2
-        if abs(cos_theta3) > 1:
-            results['unreachable'] = True
-            continue
-
-        # theta1 calculation (adjust for A- case)
-        theta1 = np.arctan2(py, px)
-        if A_sign < 0:
-            theta1 = theta1 + np.pi if theta1 < 0 else theta1 - np.pi
-        
-        # Elbow solutions
-        for theta3 in [np.arccos(cos_theta3), -np.arccos(cos_theta3)]:
-            # Shoulder angle calculation
-            C = 2 * (np.cos(theta3/2)**2)
-            D = np.sin(theta3)
-            theta2 = np.arctan2(B*C - A*D, A*C + B*D)
-
-            # Check joint limits
-            theta2_valid = theta2_min <= theta2 <= theta2_max
-            theta3_valid = theta3_min <= theta3 <= theta3_max
-
-            config = "plus-" if theta2 > 0 else "minus-"
-            config += "plus" if theta3 > 0 else "minus"
-            # config += 'A: plus' if A_sign > 0 else 'A: minus'
-            candidate_solution = (theta1, theta2, theta3, config)
-
-            if joint_limits:
-                if theta2_valid and theta3_valid:
-                    
-                    results['valid'].append(candidate_solution)
-
-                else:
-                    results['invalid'].append(candidate_solution)
-            else:
-                results['valid'].append(candidate_solution)
-    
-    return results
+    return {
+        'theta1': candidates[0],
+        'theta2': candidates[1],
+        'theta3': candidates[2],
+        'cfg': candidates[3].astype(np.int8),
+        'A_sign': _A_SIGNS.copy(),
+        'valid_mask': valid_mask,
+        'unreachable': unreachable
+    }
+
+
+def solve_ik(px, py, pz, elbow_code, prefer_A_sign=0.0):
+    """
+    Single IK solution for a goal with the requested elbow config, in one compiled call.
+
+    Args:
+        px, py, pz: Target end-effector position
+        elbow_code: Requested elbow config code (see _CFG_CODES)
+        prefer_A_sign: Warm start, the A sign of the previous solution. When both
+            branches have a matching solution, the one on this branch is returned
+
+    Returns:
+        (status, theta1, theta2, theta3, A_sign), status 1 if found, 0 if no
+        solution matches the config within joint limits, -1 if unreachable
+    """
+    return _ik_select_compiled(float(px), float(py), float(pz), int(elbow_code), float(prefer_A_sign))
+
+
+def inverse_kinematics_batch(P):
+    """
+    Compute inverse kinematics for many targets in parallel, e.g. trajectory waypoints.
+
+    Args:
+        P: (N, 3) array of target end-effector positions
+
+    Returns:
+        (N, 5, 4) array of IK candidates per target, laid out as in _ik_fill
+    """
+    P = np.ascontiguousarray(P, dtype=np.float64).reshape(-1, 3)
+    out = np.empty((P.shape[0], 5, 4))
+    _ik_batch(P, out)
+    return out
 
 
 if __name__ == "__main__":
@@ -89,15 +205,19 @@ if __name__ == "__main__":
         print("Target is outside workspace!")
     else:
         print("\nVALID SOLUTIONS:")
-        for i, (theta1, theta2, theta3, config) in enumerate(results['valid']):
-            print(f"Solution {i+1} ({config}):")
-            print(f"\ttheta1 = {np.degrees(theta1):.1f}° ({theta1:.4f} rad)")
-            print(f"\ttheta2 = {np.degrees(theta2):.1f}° ({theta2:.4f} rad)")
-            print(f"\ttheta3 = {np.degrees(theta3):.1f}° ({theta3:.4f} rad)")
+        valid_idx = np.nonzero(results['valid_mask'])[0]
+        for i, k in enumerate(valid_idx):
+            theta1, theta2, theta3 = results['theta1'][k], results['theta2'][k], results['theta3'][k]
+            print(f"Solution {i+1} ({_CFG_NAMES[results['cfg'][k]]}):")
+            print(f"\ttheta1 = {math.degrees(theta1):.1f}° ({theta1:.4f} rad)")
+            print(f"\ttheta2 = {math.degrees(theta2):.1f}° ({theta2:.4f} rad)")
+            print(f"\ttheta3 = {math.degrees(theta3):.1f}° ({theta3:.4f} rad)")
         
         print("\nINVALID SOLUTIONS (violate joint limits):")
-        for i, (theta1, theta2, theta3, config) in enumerate(results['invalid']):
-            print(f"Solution {i+1} ({config}):")
-            print(f"\ttheta1 = {np.degrees(theta1):.1f}° ({theta1:.4f} rad)")
-            print(f"\ttheta2 = {np.degrees(theta2):.1f}° ({theta2:.4f} rad)") 
-            print(f"\ttheta3 = {np.degrees(theta3):.1f}° ({theta3:.4f} rad)")
+        invalid_idx = np.nonzero(~results['valid_mask'])[0]
+        for i, k in enumerate(invalid_idx):
+            theta1, theta2, theta3 = results['theta1'][k], results['theta2'][k], results['theta3'][k]
+            print(f"Solution {i+1} ({_CFG_NAMES[results['cfg'][k]]}):")
+            print(f"\ttheta1 = {math.degrees(theta1):.1f}° ({theta1:.4f} rad)")
+            print(f"\ttheta2 = {math.degrees(theta2):.1f}° ({theta2:.4f} rad)") 
+            print(f"\ttheta3 = {math.degrees(theta3):.1f}° ({theta3:.4f} rad)")